@@ -12,28 +12,73 @@ What You'll Learn:
 Prerequisites: You should know Flask basics (routes, templates, render_template)
 """
 
-from flask import Flask, render_template
+import click
+from flask import Flask, render_template, g, request, make_response
+import os
 import sqlite3  # Built-in Python library for SQLite database
+from jinja2 import FileSystemBytecodeCache
 
 app = Flask(__name__)
 
+# Save compiled templates to disk (system temp dir) so new worker
+# processes skip re-compiling them on their first request
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 DATABASE = 'students.db'  # Database file name (auto-created)
 
+# SQL and sample data kept at module level. The string and the inner tuples
+# were already constants; the only thing saved per request is the outer list.
+INSERT_STUDENT_SQL = 'INSERT INTO students (name, email, course) VALUES (?, ?, ?)'
+
+SAMPLE_STUDENTS = (
+    ('Mayuri Mahajan', 'mayuri@gmail.com', 'Data Science'),
+    ('Amit Sharma', 'amit@gmail.com', 'Web Development'),
+    ('Sneha Patil', 'sneha@gmail.com', 'Machine Learning'),
+)
+
+# Per-connection tuning (these settings reset every time a connection opens)
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',     # Safe with WAL, far fewer fsyncs
+    'PRAGMA temp_store=MEMORY',      # Temp tables/indexes in RAM
+    'PRAGMA mmap_size=268435456',    # Read pages via 256 MB memory map
+    'PRAGMA cache_size=-20000',      # ~20 MB page cache
+)
+
 
 # =============================================================================
 # DATABASE HELPER FUNCTIONS
 # =============================================================================
 
-def get_db_connection():
-    """Create a connection to the database"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # Access columns by name
-    return conn
+def get_db():
+    """Return the connection for the current request, opening it on first use"""
+    if 'db' not in g:
+        g.db = sqlite3.connect(DATABASE, detect_types=sqlite3.PARSE_DECLTYPES)
+        g.db.row_factory = sqlite3.Row  # Access columns by name
+        apply_pragmas(g.db)
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(e=None):
+    """Close the request's connection (if one was opened) when it ends"""
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+
+def apply_pragmas(conn):
+    """Apply the per-connection PRAGMA settings"""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
 
 
 def init_db():
     """Create students table if it doesn't exist"""
-    conn = get_db_connection()
+    conn = sqlite3.connect(DATABASE)
+    # WAL is stored in the database file, so setting it once is enough.
+    # Readers no longer block the writer (and vice versa).
+    conn.execute('PRAGMA journal_mode=WAL')
+    apply_pragmas(conn)
     conn.execute('''
         CREATE TABLE IF NOT EXISTS students (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,6 +91,13 @@ def init_db():
     conn.close()
 
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database tables (run once: flask --app app init-db)"""
+    init_db()
+    click.echo('Initialized the database.')
+
+
 # =============================================================================
 # ROUTES
 # =============================================================================
@@ -53,10 +105,20 @@ def init_db():
 @app.route('/')
 def index():
     """Home page - Display all students"""
-    conn = get_db_connection()
+    conn = get_db()
+
+    # Students are only ever added, so (count, highest id) changes on every insert.
+    # If the browser already has this version, reply "304 Not Modified".
+    count, max_id = conn.execute('SELECT COUNT(*), MAX(id) FROM students').fetchone()
+    etag = f'{count}-{max_id}'
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+
     students = conn.execute('SELECT * FROM students').fetchall()
-    conn.close()
-    return render_template('index.html', students=students)
+    response = make_response(render_template('index.html', students=students))
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # Always re-check before reusing the cached page
+    return response
 
 
 @app.route('/add')
@@ -65,19 +127,10 @@ def add_sample_student():
     Add sample students to database
     (Exercise solution: adding different students)
     """
-    conn = get_db_connection()
+    conn = get_db()
 
-    conn.executemany(
-        'INSERT INTO students (name, email, course) VALUES (?, ?, ?)',
-        [
-            ('Mayuri Mahajan', 'mayuri@gmail.com', 'Data Science'),
-            ('Amit Sharma', 'amit@gmail.com', 'Web Development'),
-            ('Sneha Patil', 'sneha@gmail.com', 'Machine Learning')
-        ]
-    )
-
-    conn.commit()
-    conn.close()
+    with conn:  # One transaction: commits on success, rolls back on error
+        conn.executemany(INSERT_STUDENT_SQL, SAMPLE_STUDENTS)
 
     return 'Sample students added! <a href="/">Go back to home</a>'
 
@@ -87,7 +140,8 @@ def add_sample_student():
 # =============================================================================
 
 if __name__ == '__main__':
-    init_db()  # Create table when app starts
+    if not os.path.exists(DATABASE):
+        init_db()  # First run only - afterwards use `flask --app app init-db`
     app.run(debug=True)
 
 
@@ -102,6 +156,8 @@ if __name__ == '__main__':
 #
 # 2. Connection Flow:
 #    connect → execute SQL → commit (if changing data) → close
+#    - get_db() keeps one connection per request on flask.g
+#    - close_db() closes it automatically when the request ends
 #
 # 3. SQL Commands Used:
 #    - CREATE TABLE: Define table structure
@@ -112,6 +168,11 @@ if __name__ == '__main__':
 #    - Without this: row[0], row[1] (access by index)
 #    - With this: row['name'], row['email'] (access by column name)
 #
+# 5. PRAGMA settings:
+#    - journal_mode=WAL: readers and the writer don't block each other
+#    - synchronous/temp_store/mmap_size/cache_size: must be set on
+#      every new connection (see apply_pragmas)
+#
 # =============================================================================
 
 
@@ -119,7 +180,7 @@ if __name__ == '__main__':
 # EXERCISE:
 # =============================================================================
 #
-# Try modifying `add_sample_student()` to add different students with
-# different names!
+# Try modifying `SAMPLE_STUDENTS` (used by `add_sample_student()`) to add
+# different students with different names!
 #
 # =============================================================================
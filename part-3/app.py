@@ -12,19 +12,55 @@ What You'll Learn:
 Prerequisites: Complete part-1 and part-2
 Install: pip install flask-sqlalchemy
 """
-from flask import Flask, render_template, request, redirect, url_for, flash
+import importlib.metadata
+import os
+import sqlite3
+import time
+
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, make_response, session, abort, g
 from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key'
 
+# Jinja bytecode cache: compiled templates are reused across processes
+# (template auto-reload already stays off unless debug mode is on)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 # =============================================================================
 # DATABASE CONFIGURATION
 # =============================================================================
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///school.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Connection pool: LIFO hands out the most recently used connection first,
+# so a few "hot" connections (with warm SQLite caches) get reused while
+# extra overflow connections sit idle and get recycled.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_use_lifo': True,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+    'connect_args': {'check_same_thread': False},  # Pooled connections move between threads
+}
+
+# autoflush off: queries don't first check the session for pending changes.
+# Handlers change data and then commit(), and commit() always flushes.
+db = SQLAlchemy(app, session_options={'autoflush': False})
+
+# INSERT ... RETURNING needs SQLAlchemy 2.0+ and SQLite 3.35+.
+# SQLite ships with Python itself (not pip), so check what we actually got.
+SUPPORTS_RETURNING = (
+    sqlite3.sqlite_version_info >= (3, 35)
+    and int(importlib.metadata.version('sqlalchemy').split('.')[0]) >= 2
+)
+
+# Page sizes for the list pages
+STUDENTS_PER_PAGE = 50
+COURSES_PER_PAGE = 10
 
 # =============================================================================
 # MODELS
@@ -32,9 +68,12 @@ db = SQLAlchemy(app)
 
 # Teacher Model
 class Teacher(db.Model):
+    # Named unique index: enforces unique emails and speeds up email lookups
+    __table_args__ = (db.Index('ix_teacher_email', 'email', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)  # Index speeds up ORDER BY name
+    email = db.Column(db.String(120), nullable=False)
 
     courses = db.relationship('Course', backref='teacher', lazy=True)
 
@@ -55,9 +94,11 @@ class Course(db.Model):
 
 # Student Model
 class Student(db.Model):
+    __table_args__ = (db.Index('ix_student_email', 'email', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)  # Index speeds up ORDER BY name
+    email = db.Column(db.String(120), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
 
     def __repr__(self):
@@ -67,11 +108,87 @@ class Student(db.Model):
 # ROUTES
 # =============================================================================
 
+# ---------------- ONE COMMIT PER REQUEST ----------------
+# Handlers only flush() their changes (sending the SQL and surfacing errors);
+# this hook commits everything a request did in a single transaction.
+# Error responses are not committed - Flask-SQLAlchemy rolls them back when
+# the request ends.
+@app.after_request
+def commit_session(response):
+    if response.status_code < 400:
+        db.session.commit()
+        # Only expire the dropdown cache once the new courses are committed -
+        # bumping 'gen' also stops in-flight requests from storing the old list
+        if g.pop('courses_changed', False):
+            _courses_cache.update(ts=float('-inf'), gen=_courses_cache['gen'] + 1)
+    return response
+
+# ---------------- COURSE DROPDOWN CACHE ----------------
+# The add/edit student forms only need (id, name) of each course, and courses
+# rarely change - so keep the list in memory for a short while.
+# (Each worker process has its own copy; use Redis or similar to share it.)
+COURSES_CACHE_SECONDS = 30
+# 'ts' = -inf means expired; 'gen' counts committed course changes
+_courses_cache = {'v': None, 'ts': float('-inf'), 'gen': 0}
+
+@app.before_request
+def remember_courses_generation():
+    # Recorded before this request reads anything from the database, so any
+    # course change committed after this point shows up as a newer 'gen'
+    g.courses_gen = _courses_cache['gen']
+
+def get_courses():
+    """Course (id, name) rows for dropdowns, cached for COURSES_CACHE_SECONDS"""
+    if time.monotonic() - _courses_cache['ts'] < COURSES_CACHE_SECONDS:
+        return _courses_cache['v']
+    rows = db.session.execute(db.select(Course.id, Course.name).order_by(Course.id)).all()
+    # Don't cache rows that may predate a course change committed meanwhile
+    if _courses_cache['gen'] == g.courses_gen:
+        _courses_cache.update(v=rows, ts=time.monotonic())
+    return rows
+
+def invalidate_courses():
+    """Call after adding/removing courses; the cache expires when the request commits"""
+    g.courses_changed = True
+
 # ---------------- STUDENTS ----------------
+def students_etag():
+    """Version of the students table - bumped by triggers on every add, edit or delete"""
+    version = db.session.execute(
+        db.text('SELECT version FROM student_version WHERE id = 1')
+    ).scalar_one()
+    return f'students-v{version}'
+
 @app.route('/')
 def index():
-    students = Student.query.order_by(Student.name).all()
-    return render_template('index.html', students=students)
+    # HTTP caching: if the browser's copy is still current, answer "304 Not Modified"
+    # without running the list query or rendering (unless a flash message is waiting)
+    etag = students_etag()
+    if request.if_none_match.contains(etag) and '_flashes' not in session:
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    # Read-only page: select plain rows (no ORM objects) with the course name joined in
+    query = (
+        db.select(Student.id, Student.name, Student.email, Course.name.label('course_name'))
+        .join(Course)
+        .order_by(Student.name, Student.id)
+    )
+
+    # Keyset pagination: continue after the last (name, id) of the previous page
+    after_name = request.args.get('after_name')
+    after_id = request.args.get('after_id', type=int)
+    if after_name is not None and after_id is not None:
+        query = query.where(db.tuple_(Student.name, Student.id) > (after_name, after_id))
+
+    # Fetch one extra row to know whether there is a next page
+    students = db.session.execute(query.limit(STUDENTS_PER_PAGE + 1)).all()
+    next_student = students[STUDENTS_PER_PAGE - 1] if len(students) > STUDENTS_PER_PAGE else None
+    response = make_response(
+        render_template('index.html', students=students[:STUDENTS_PER_PAGE], next_student=next_student)
+    )
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # Browser must re-check with us before reusing it
+    return response
 
 @app.route('/add', methods=['GET', 'POST'])
 def add_student():
@@ -82,41 +199,52 @@ def add_student():
             course_id=request.form['course_id']
         )
         db.session.add(student)
-        db.session.commit()
+        db.session.flush()
         flash('Student added successfully!', 'success')
         return redirect(url_for('index'))
 
-    courses = Course.query.all()
-    return render_template('add.html', courses=courses)
+    return render_template('add.html', courses=get_courses())
 
 @app.route('/edit/<int:id>', methods=['GET', 'POST'])
 def edit_student(id):
-    student = Student.query.get_or_404(id)
+    student = db.session.get(Student, id) or abort(404)
 
     if request.method == 'POST':
         student.name = request.form['name']
         student.email = request.form['email']
         student.course_id = request.form['course_id']
-        db.session.commit()
+        db.session.flush()
         flash('Student updated successfully!', 'success')
         return redirect(url_for('index'))
 
-    courses = Course.query.all()
-    return render_template('edit.html', student=student, courses=courses)
+    return render_template('edit.html', student=student, courses=get_courses())
 
 @app.route('/delete/<int:id>')
 def delete_student(id):
-    student = Student.query.get_or_404(id)
-    db.session.delete(student)
-    db.session.commit()
+    # DELETE ... WHERE id = ? directly - no need to load the student first
+    deleted = db.session.execute(db.delete(Student).where(Student.id == id)).rowcount
+    if not deleted:
+        abort(404)
     flash('Student deleted successfully!', 'danger')
     return redirect(url_for('index'))
 
 # ---------------- COURSES ----------------
 @app.route('/courses')
 def courses():
-    all_courses = Course.query.limit(10).all()
-    return render_template('courses.html', courses=all_courses)
+    # Read-only page: plain rows with the enrolment count computed by the database
+    query = (
+        db.select(Course.id, Course.name, Course.description,
+                  db.func.count(Student.id).label('student_count'))
+        .outerjoin(Student)
+        .group_by(Course.id)
+        .order_by(Course.id)
+    )
+
+    # Keyset pagination: "WHERE id > ?" instead of OFFSET (which re-scans skipped rows)
+    after = request.args.get('after', 0, type=int)
+    all_courses = db.session.execute(query.where(Course.id > after).limit(COURSES_PER_PAGE + 1)).all()
+    next_after = all_courses[COURSES_PER_PAGE - 1].id if len(all_courses) > COURSES_PER_PAGE else None
+    return render_template('courses.html', courses=all_courses[:COURSES_PER_PAGE], next_after=next_after)
 
 @app.route('/add-course', methods=['GET', 'POST'])
 def add_course():
@@ -127,7 +255,8 @@ def add_course():
             teacher_id=request.form['teacher_id']
         )
         db.session.add(course)
-        db.session.commit()
+        db.session.flush()
+        invalidate_courses()
         flash('Course added successfully!', 'success')
         return redirect(url_for('courses'))
 
@@ -135,32 +264,52 @@ def add_course():
     return render_template('add_course.html', teachers=teachers)
 
 # ---------------- TEACHERS ----------------
+def fts_prefix_query(text):
+    """Turn 'sha meh' into the FTS5 query '"sha"* "meh"*' (each word as a prefix)"""
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
 @app.route('/teachers')
 def teachers():
-    teacher_list = Teacher.query.filter(Teacher.name.like('%a%')).all()
-    return render_template('teachers.html', teachers=teacher_list)
+    query = Teacher.query.options(db.selectinload(Teacher.courses)).order_by(Teacher.name)
+
+    # Search by name through the teacher_fts full-text index: a LIKE '%...%'
+    # scan would have to check every row, MATCH looks words up in the index
+    q = request.args.get('q', '').strip()
+    if q:
+        matches = db.text('SELECT rowid FROM teacher_fts WHERE teacher_fts MATCH :q')
+        query = query.filter(Teacher.id.in_(
+            matches.bindparams(q=fts_prefix_query(q)).columns(db.column('rowid'))
+        ))
+
+    return render_template('teachers.html', teachers=query.all(), q=q)
 
 # ✅ ADD TEACHER + COURSE TOGETHER
 @app.route('/add-teacher', methods=['GET', 'POST'])
 def add_teacher():
     if request.method == 'POST':
 
-        # 1️⃣ Create Teacher
-        teacher = Teacher(
-            name=request.form['teacher_name'],
-            email=request.form['teacher_email']
-        )
-        db.session.add(teacher)
-        db.session.commit()   # get teacher.id
+        # 1️⃣ Create Teacher - RETURNING sends back the new id with the INSERT
+        if SUPPORTS_RETURNING:
+            teacher_id = db.session.execute(
+                db.insert(Teacher)
+                .values(name=request.form['teacher_name'], email=request.form['teacher_email'])
+                .returning(Teacher.id)
+            ).scalar_one()
+        else:
+            teacher = Teacher(name=request.form['teacher_name'], email=request.form['teacher_email'])
+            db.session.add(teacher)
+            db.session.flush()    # get teacher.id (sends INSERT, keeps transaction open)
+            teacher_id = teacher.id
 
         # 2️⃣ Create Course for that Teacher
-        course = Course(
-            name=request.form['course_name'],
-            description=request.form['course_description'],
-            teacher_id=teacher.id
-        )
-        db.session.add(course)
-        db.session.commit()
+        db.session.execute(
+            db.insert(Course).values(
+                name=request.form['course_name'],
+                description=request.form['course_description'],
+                teacher_id=teacher_id
+            )
+        )   # Both inserts are committed together by commit_session()
+        invalidate_courses()
 
         flash('Teacher and Course added successfully!', 'success')
         return redirect(url_for('teachers'))
@@ -169,12 +318,12 @@ def add_teacher():
 
 @app.route('/edit-teacher/<int:id>', methods=['GET', 'POST'])
 def edit_teacher(id):
-    teacher = Teacher.query.get_or_404(id)
+    teacher = db.session.get(Teacher, id) or abort(404)
 
     if request.method == 'POST':
         teacher.name = request.form['name']
         teacher.email = request.form['email']
-        db.session.commit()
+        db.session.flush()
         flash('Teacher updated successfully!', 'success')
         return redirect(url_for('teachers'))
 
@@ -182,39 +331,106 @@ def edit_teacher(id):
 
 @app.route('/delete-teacher/<int:id>')
 def delete_teacher(id):
-    teacher = Teacher.query.get_or_404(id)
-    db.session.delete(teacher)
-    db.session.commit()
-    flash('Teacher deleted successfully!', 'danger')
+    # Never delete students as a side effect: refuse while any of the
+    # teacher's courses still has students enrolled
+    teacher_courses = db.select(Course.id).where(Course.teacher_id == id)
+    has_students = db.session.execute(
+        db.select(Student.id).where(Student.course_id.in_(teacher_courses)).limit(1)
+    ).first()
+    if has_students:
+        flash('Cannot delete this teacher: their courses still have students enrolled.', 'danger')
+        return redirect(url_for('teachers'))
+
+    # Remove the teacher's (now empty) courses first, so no course is left
+    # pointing at a teacher that no longer exists
+    db.session.execute(db.delete(Course).where(Course.teacher_id == id))
+
+    deleted = db.session.execute(db.delete(Teacher).where(Teacher.id == id)).rowcount
+    if not deleted:
+        abort(404)
+    invalidate_courses()
+    flash('Teacher and their courses deleted successfully!', 'danger')
     return redirect(url_for('teachers'))
 
 # =============================================================================
 # DATABASE INITIALIZATION
 # =============================================================================
+# Full-text search index over teacher names. It is an "external content"
+# table: it stores only the index, and the triggers keep it in sync.
+TEACHER_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS teacher_fts USING fts5(name, content='teacher', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS teacher_fts_ai AFTER INSERT ON teacher BEGIN
+        INSERT INTO teacher_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS teacher_fts_ad AFTER DELETE ON teacher BEGIN
+        INSERT INTO teacher_fts(teacher_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS teacher_fts_au AFTER UPDATE ON teacher BEGIN
+        INSERT INTO teacher_fts(teacher_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO teacher_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO teacher_fts(teacher_fts) VALUES ('rebuild')",  # Index any existing rows
+]
+
+# Single-row version counter for the student table. The triggers bump it on
+# every change, so the student list's ETag is a one-row primary-key lookup.
+STUDENT_VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS student_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO student_version (id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS student_version_ai AFTER INSERT ON student BEGIN
+        UPDATE student_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_version_au AFTER UPDATE ON student BEGIN
+        UPDATE student_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_version_ad AFTER DELETE ON student BEGIN
+        UPDATE student_version SET version = version + 1 WHERE id = 1;
+    END""",
+]
+
 def init_db():
     with app.app_context():
         db.create_all()
 
-        if Teacher.query.count() == 0:
-            t1 = Teacher(name='Dr. Sharma', email='sharma@gmail.com')
-            t2 = Teacher(name='Prof. Mehta', email='mehta@gmail.com')
-            db.session.add_all([t1, t2])
+        for statement in STUDENT_VERSION_DDL + TEACHER_FTS_DDL:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+
+        # Seed data: bulk_insert_mappings skips building ORM objects and
+        # sends one multi-row INSERT per table.
+        # ".first()" only needs one row to know the table isn't empty
+        # (cheaper than counting every row).
+        if not db.session.query(Teacher.id).first():
+            db.session.bulk_insert_mappings(Teacher, [
+                {'name': 'Dr. Sharma', 'email': 'sharma@gmail.com'},
+                {'name': 'Prof. Mehta', 'email': 'mehta@gmail.com'},
+            ])
             db.session.commit()
 
-        if Course.query.count() == 0:
-            courses = [
-                Course(name='Python Basics', description='Intro to Python', teacher_id=1),
-                Course(name='Web Development', description='Flask & Web', teacher_id=2),
-                Course(name='Data Science', description='Data Analysis', teacher_id=1),
-            ]
-            db.session.add_all(courses)
+        if not db.session.query(Course.id).first():
+            db.session.bulk_insert_mappings(Course, [
+                {'name': 'Python Basics', 'description': 'Intro to Python', 'teacher_id': 1},
+                {'name': 'Web Development', 'description': 'Flask & Web', 'teacher_id': 2},
+                {'name': 'Data Science', 'description': 'Data Analysis', 'teacher_id': 1},
+            ])
             db.session.commit()
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables and seed data (run once: flask --app app init-db)"""
+    init_db()
+    click.echo('Initialized the database.')
+
 # =============================================================================
 # RUN APP
 # =============================================================================
 if __name__ == '__main__':
-    init_db()
+    # Only touch the schema when the database file doesn't exist yet
+    # (path taken from the engine, so it follows SQLALCHEMY_DATABASE_URI)
+    with app.app_context():
+        db_path = db.engine.url.database
+    if not os.path.exists(db_path):
+        init_db()
     app.run(debug=True)
 
 
@@ -230,8 +446,10 @@ if __name__ == '__main__':
 # Get by ID      | SELECT * WHERE id = ?            | Student.query.get(id)
 # Filter         | SELECT * WHERE name = ?          | Student.query.filter_by(name='John')
 # Insert         | INSERT INTO students VALUES...   | db.session.add(student)
+# Insert + id    | INSERT ... RETURNING id          | db.insert(Student).values(...).returning(Student.id)
 # Update         | UPDATE students SET...           | student.name = 'New'; db.session.commit()
 # Delete         | DELETE FROM students WHERE...    | db.session.delete(student)
+# Delete by id   | DELETE FROM students WHERE id=?  | db.session.execute(db.delete(Student).where(Student.id == id))
 #
 # =============================================================================
 # COMMON QUERY METHODS:
@@ -241,10 +459,15 @@ if __name__ == '__main__':
 # Student.query.first()                  - Get first record
 # Student.query.get(1)                   - Get by primary key
 # Student.query.get_or_404(1)            - Get or show 404 error
+# db.session.get(Student, 1) or abort(404)  - Same, via the faster Session.get
 # Student.query.filter_by(name='John')   - Filter by exact value
-# Student.query.filter(Student.name.like('%john%'))  - Filter with LIKE
+# Student.query.filter(Student.name.like('%john%'))  - Filter with LIKE (scans every row)
 # Student.query.order_by(Student.name)   - Order results
 # Student.query.count()                  - Count records
+# db.session.query(Student.id).first()   - Check if any record exists
+# Course.query.options(db.selectinload(Course.students)) - Load related rows up front
+# db.session.execute(db.select(Student.name)).all()  - Plain rows, no ORM objects
+# Course.query.filter(Course.id > last_id).limit(10) - Keyset pagination
 #
 # =============================================================================
 